@@ -2,13 +2,28 @@ from carbonai_mistral import CarbonAIMistral
 import sys
 import time
 import os
+import re
+
+# Typewriter animation is opt-in, e.g. CARBON_ANIMATE=1 python carbon_console.py
+ANIMATE = os.getenv('CARBON_ANIMATE') == '1'
 
 def print_slowly(text, delay=0.02):
-    """Print text character by character for a cool effect"""
-    for char in text:
-        sys.stdout.write(char)
+    """Print text, word by word for a cool effect when CARBON_ANIMATE=1"""
+    if ANIMATE:
+        for word in re.findall(r'\S+\s*|\s+', text):
+            sys.stdout.write(word)
+            sys.stdout.flush()
+            time.sleep(delay)
+    else:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+    print()
+
+def print_stream(chunks):
+    """Print text chunks as soon as the model produces them"""
+    for chunk in chunks:
+        sys.stdout.write(chunk)
         sys.stdout.flush()
-        time.sleep(delay)
     print()
 
 def display_welcome():
@@ -51,8 +66,7 @@ def main():
                 
             print("\nCarbon: ", end="")
             try:
-                response = carbon_ai.generate_response(user_input)
-                print_slowly(response)
+                print_stream(carbon_ai.stream_response(user_input))
             except Exception as e:
                 print_slowly(f"I apologize, but I encountered an error: {str(e)}")
                 print_slowly("Please try asking your question in a different way.")
@@ -1,17 +1,56 @@
-import requests
-import pandas as pd
+import requests_cache
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import time
+from itertools import islice
 from urllib.parse import quote
 
+# Search seeds, in order; dict.fromkeys drops any repeats so no query is sent twice
+SEARCH_TERMS = tuple(dict.fromkeys([
+    # Core elements
+    "Carbon element", "Silicon element", "Germanium element", 
+    "Tin element", "Lead element", "Flerovium",
+    
+    # Compounds and related terms
+    "Carbon compounds", "Silicon compounds", "Germanium compounds",
+    "Tin compounds", "Lead compounds",
+    "Carbon allotropes", "Silicon allotropes",
+    "Carbon nanotubes", "Graphene", "Diamond",
+    "Silicates", "Germanates", "Stannates",
+    
+    # Applications and properties
+    "Carbon chemistry", "Silicon chemistry", "Germanium chemistry",
+    "Tin chemistry", "Lead chemistry",
+    "Carbon materials", "Silicon materials",
+    "Semiconductor materials", "Group 14 elements",
+    
+    # Industrial and technological applications
+    "Carbon fiber", "Silicon chips", "Germanium transistors",
+    "Tin plating", "Lead acid battery",
+    
+    # Environmental and safety
+    "Carbon cycle", "Silicon cycle", "Lead poisoning",
+    "Carbon emissions", "Carbon sequestration",
+    
+    # Analytical methods
+    "Carbon dating", "Silicon analysis", "Lead testing",
+    "Carbon isotopes", "Silicon isotopes"
+]))
+
 class WikipediaLinkGenerator:
     def __init__(self):
         self.base_url = "https://en.wikipedia.org/w/api.php"
-        self.links = set()
-        self.seen_titles = set()
+        # Title -> (url, search_term); keying by title also deduplicates titles
+        self.links = {}
+        # Identical queries are answered from a local SQLite cache for a week
+        self.session = requests_cache.CachedSession('wiki_cache', backend='sqlite', expire_after=7 * 86400)
+        self.network_requests = 0
         
     def make_request(self, params):
         try:
-            response = requests.get(self.base_url, params=params)
+            response = self.session.get(self.base_url, params=params)
+            if not response.from_cache:
+                self.network_requests += 1
             return response.json()
         except Exception as e:
             print(f"Error making request: {e}")
@@ -62,75 +101,52 @@ class WikipediaLinkGenerator:
         return f"https://en.wikipedia.org/wiki/{encoded_title}"
 
     def collect_links(self, target_count=100000):
-        search_terms = [
-            # Core elements
-            "Carbon element", "Silicon element", "Germanium element", 
-            "Tin element", "Lead element", "Flerovium",
-            
-            # Compounds and related terms
-            "Carbon compounds", "Silicon compounds", "Germanium compounds",
-            "Tin compounds", "Lead compounds",
-            "Carbon allotropes", "Silicon allotropes",
-            "Carbon nanotubes", "Graphene", "Diamond",
-            "Silicates", "Germanates", "Stannates", "Lead compounds",
-            
-            # Applications and properties
-            "Carbon chemistry", "Silicon chemistry", "Germanium chemistry",
-            "Tin chemistry", "Lead chemistry",
-            "Carbon materials", "Silicon materials",
-            "Semiconductor materials", "Group 14 elements",
-            
-            # Industrial and technological applications
-            "Carbon fiber", "Silicon chips", "Germanium transistors",
-            "Tin plating", "Lead acid battery",
-            
-            # Environmental and safety
-            "Carbon cycle", "Silicon cycle", "Lead poisoning",
-            "Carbon emissions", "Carbon sequestration",
-            
-            # Analytical methods
-            "Carbon dating", "Silicon analysis", "Lead testing",
-            "Carbon isotopes", "Silicon isotopes"
-        ]
-        
+        # Each related-link lookup fetches a full link list, so stop them near the target
+        # and let search results fill the tail
+        related_cutoff = target_count * 0.95
         print("Starting to collect Wikipedia links...")
         
-        for search_term in search_terms:
+        for search_term in SEARCH_TERMS:
             if len(self.links) >= target_count:
                 break
                 
             print(f"Searching for: {search_term}")
+            network_requests = self.network_requests
             titles = self.search_wikipedia(search_term)
             
             for title in titles:
-                if title not in self.seen_titles:
-                    self.seen_titles.add(title)
-                    url = self.generate_wiki_url(title)
-                    self.links.add((title, url, search_term))
+                if title not in self.links:
+                    self.links[title] = (self.generate_wiki_url(title), search_term)
                     
                     # Get related links
-                    related_titles = self.get_related_links(title)
-                    for related_title in related_titles:
-                        if len(self.links) >= target_count:
-                            break
-                        if related_title not in self.seen_titles:
-                            self.seen_titles.add(related_title)
-                            related_url = self.generate_wiki_url(related_title)
-                            self.links.add((related_title, related_url, f"Related to {search_term}"))
+                    if len(self.links) < related_cutoff:
+                        related_titles = self.get_related_links(title)
+                        for related_title in related_titles:
+                            if len(self.links) >= target_count:
+                                break
+                            if related_title not in self.links:
+                                related_url = self.generate_wiki_url(related_title)
+                                self.links[related_title] = (related_url, f"Related to {search_term}")
                 
                 if len(self.links) >= target_count:
                     break
                     
-            time.sleep(1)  # Be nice to Wikipedia's servers
+            if self.network_requests > network_requests:
+                time.sleep(1)  # Be nice to Wikipedia's servers
 
-        return list(self.links)[:target_count]
+        return [(title, url, term) for title, (url, term) in islice(self.links.items(), target_count)]
 
     def save_to_csv(self, filename="carbon_family_links.csv"):
-        df = pd.DataFrame(list(self.links), columns=['Title', 'URL', 'Search_Term'])
-        df.to_csv(filename, index=False, encoding='utf-8')
-        print(f"\nSaved {len(df)} links to {filename}")
+        titles, urls, terms = [], [], []
+        for title, (url, term) in self.links.items():
+            titles.append(title)
+            urls.append(url)
+            terms.append(term)
+        table = pa.Table.from_pydict({'Title': titles, 'URL': urls, 'Search_Term': terms})
+        pacsv.write_csv(table, filename, write_options=pacsv.WriteOptions(include_header=True))
+        print(f"\nSaved {table.num_rows} links to {filename}")
         print(f"\nSample of collected links:")
-        print(df.head())
+        print(table.slice(0, 5).to_pandas())
 
 def main():
     generator = WikipediaLinkGenerator()
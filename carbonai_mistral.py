@@ -1,10 +1,18 @@
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
-from typing import List, Optional
+from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, DynamicCache, TextIteratorStreamer
+from typing import Iterator, List, Optional
+from threading import Lock, Thread
+from concurrent.futures import Future
+import importlib.util
+import copy
 import os
+import queue
+import time
 
 class CarbonAIMistral:
-    def __init__(self, model_name: str = "mistralai/Mistral-7B-v0.1", token: str = None):
+    def __init__(self, model_name: str = "mistralai/Mistral-7B-v0.1", token: str = None,
+                 max_batch_size: int = 8, batch_wait_ms: int = 10,
+                 backend: Optional[str] = None, quantization: Optional[str] = None):
         if token is None:
             token = os.getenv('HF_TOKEN')
             if token is None:
@@ -13,19 +21,84 @@ class CarbonAIMistral:
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         print(f"Using device: {self.device}")
         
+        # Load carbon knowledge base
+        self.carbon_knowledge = self._load_carbon_knowledge()
+
+        # "transformers" (default) or "vllm", e.g. CARBON_BACKEND=vllm python carbon_console.py
+        self.backend = backend or os.getenv('CARBON_BACKEND', 'transformers')
+        if self.backend == "vllm":
+            self._load_vllm(model_name, token, quantization)
+        elif self.backend == "transformers":
+            self._load_transformers(model_name, token)
+        else:
+            raise ValueError(f"Unknown backend: {self.backend}. Use 'transformers' or 'vllm'")
+
+        # Queued queries are generated together by a single background worker
+        self.max_batch_size = max_batch_size
+        self.batch_wait_ms = batch_wait_ms
+        self._requests = queue.Queue()
+        self._generate_lock = Lock()
+        Thread(target=self._batch_worker, daemon=True).start()
+
+    def _load_transformers(self, model_name: str, token: str):
+        """Load the model with transformers and prefill the knowledge-base prefix"""
         # Load tokenizer and model
         self.tokenizer = AutoTokenizer.from_pretrained(model_name, token=token)
+        # Mistral has no pad token; left padding keeps each question next to its answer
+        self.tokenizer.pad_token = self.tokenizer.pad_token or self.tokenizer.eos_token
+        self.tokenizer.padding_side = "left"
         self.model = AutoModelForCausalLM.from_pretrained(
             model_name,
             token=token,
-            torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
             low_cpu_mem_usage=True,
-            device_map="auto"
+            device_map="auto",
+            attn_implementation=self._attention_implementation(),
+            **self._precision_kwargs()
+        )
+
+        # Compiled decode pays a long warmup on the first call, so it is opt-in
+        self.compiled = os.getenv('CARBON_COMPILE') == '1'
+        if self.compiled:
+            self.model.forward = torch.compile(self.model.forward, mode="reduce-overhead", fullgraph=True)
+
+        # Prefill the knowledge prefix once so each turn only processes the question.
+        # Compiled decode needs the static cache instead, which cannot be seeded this way.
+        self.prefix_ids = self.tokenizer(self._prompt_prefix(), return_tensors="pt").input_ids.to(self.device)
+        self.prefix_kv = None if self.compiled else self._prefill_prefix()
+
+    def _load_vllm(self, model_name: str, token: str, quantization: Optional[str]):
+        """Load the model into a vLLM engine (paged attention, CUDA graphs, prefix caching)"""
+        # Optional dependency, only needed for this backend
+        from vllm import LLM, SamplingParams
+        os.environ.setdefault('HF_TOKEN', token)
+        self._sampling_params = SamplingParams
+        # Prefix caching reuses the knowledge-base prefix KV across requests automatically
+        self.llm = LLM(
+            model=model_name,
+            dtype="float16",
+            quantization=quantization,
+            gpu_memory_utilization=0.9,
+            enable_prefix_caching=True
         )
         
-        # Load carbon knowledge base
-        self.carbon_knowledge = self._load_carbon_knowledge()
-        
+    def _precision_kwargs(self) -> dict:
+        """Pick 4-bit NF4 weights on GPU, plain floats on CPU"""
+        if self.device == "cuda":
+            # bitsandbytes kernels are CUDA only; compute still runs in fp16
+            return {"quantization_config": BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_compute_dtype=torch.float16,
+                bnb_4bit_use_double_quant=True
+            )}
+        return {"torch_dtype": torch.float32}
+
+    def _attention_implementation(self) -> str:
+        """Use FlashAttention-2 when it is installed on a GPU, PyTorch SDPA otherwise"""
+        if self.device == "cuda" and importlib.util.find_spec("flash_attn") is not None:
+            return "flash_attention_2"
+        return "sdpa"
+
     def _load_carbon_knowledge(self) -> str:
         """Load the carbon knowledge base from carbon.txt"""
         try:
@@ -35,44 +108,179 @@ class CarbonAIMistral:
             print(f"Warning: Could not load carbon.txt: {e}")
             return ""
             
-    def generate_response(self, query: str, max_length: int = 500) -> str:
-        """Generate a response about carbon-related topics"""
-        # Create a context-aware prompt
-        prompt = f"""Based on scientific knowledge about carbon and its properties:
+    def _prompt_prefix(self) -> str:
+        """Static part of the prompt, shared by every question"""
+        return f"""Based on scientific knowledge about carbon and its properties:
         
 Knowledge Context:
 {self.carbon_knowledge[:2000]}  # Use first 2000 chars of knowledge base
 
-Question: {query}
+Question:"""
+
+    def _prompt_suffix(self, query: str) -> str:
+        """Per-question part of the prompt, appended after the prefix"""
+        # No leading space: the tokenizer adds its own word boundary marker
+        return f"""{query}
 
 Please provide a detailed, scientifically accurate response:"""
 
-        # Tokenize input
-        inputs = self.tokenizer(prompt, return_tensors="pt").to(self.device)
-        
-        # Generate response
+    def _prefill_prefix(self) -> DynamicCache:
+        """Run the prompt prefix through the model and keep its KV cache"""
         with torch.no_grad():
-            outputs = self.model.generate(
-                **inputs,
-                max_length=max_length,
-                num_return_sequences=1,
-                temperature=0.7,
-                top_p=0.9,
-                do_sample=True,
-                pad_token_id=self.tokenizer.eos_token_id
-            )
+            outputs = self.model(self.prefix_ids, past_key_values=DynamicCache(), use_cache=True)
+        return outputs.past_key_values
+
+    def _build_inputs(self, queries: List[str]) -> dict:
+        """Tokenize only the questions and append them to the cached prefix tokens"""
+        # Padding lands between the shared prefix and each question, masked out
+        suffix = self.tokenizer(
+            [self._prompt_suffix(query) for query in queries],
+            add_special_tokens=False, padding=True, return_tensors="pt"
+        ).to(self.device)
+        prefix_ids = self.prefix_ids.expand(len(queries), -1)
+        return {
+            "input_ids": torch.cat([prefix_ids, suffix.input_ids], dim=-1),
+            "attention_mask": torch.cat([torch.ones_like(prefix_ids), suffix.attention_mask], dim=-1)
+        }
+
+    def _generation_kwargs(self, max_new_tokens: int, batch_size: int = 1) -> dict:
+        """Sampling settings shared by blocking and streaming generation"""
+        kwargs = dict(
+            max_new_tokens=max_new_tokens,
+            use_cache=True,
+            num_return_sequences=1,
+            temperature=0.7,
+            top_p=0.9,
+            do_sample=True,
+            pad_token_id=self.tokenizer.eos_token_id
+        )
+        if self.prefix_kv is not None:
+            # generate() extends the cache in place, so every call gets its own copy
+            cache = copy.deepcopy(self.prefix_kv)
+            if batch_size > 1:
+                cache.batch_repeat_interleave(batch_size)
+            kwargs["past_key_values"] = cache
+        else:
+            # Fixed-shape KV cache so a compiled forward is not retraced every step
+            kwargs["cache_implementation"] = "static"
+        return kwargs
+
+    def generate_batch(self, queries: List[str], max_new_tokens: int = 500) -> List[str]:
+        """Generate responses for several queries in one batched generate() call"""
+        return self._generate_texts(queries, [max_new_tokens] * len(queries))
+
+    def _generate_texts(self, queries: List[str], limits: List[int]) -> List[str]:
+        """Generate one response per query, each capped at its own new-token limit"""
+        if self.backend == "vllm":
+            prompts = [f"{self._prompt_prefix()} {self._prompt_suffix(query)}" for query in queries]
+            params = [self._sampling_params(temperature=0.7, top_p=0.9, max_tokens=limit) for limit in limits]
+            with self._generate_lock:
+                outputs = self.llm.generate(prompts, params, use_tqdm=False)
+            return [output.outputs[0].text.strip() for output in outputs]
+
+        # The batch runs to the largest limit; trim each response to its own
+        generated = self._generate_token_batch(queries, max(limits))
+        return [self.tokenizer.decode(tokens[:limit], skip_special_tokens=True).strip()
+                for tokens, limit in zip(generated, limits)]
+
+    def submit(self, query: str, max_new_tokens: int = 500) -> Future:
+        """Queue a query for batched generation and return a future for its response"""
+        future = Future()
+        self._requests.put((query, max_new_tokens, future))
+        return future
+
+    def _batch_worker(self):
+        """Collect queued queries for up to batch_wait_ms and generate them together"""
+        while True:
+            batch = []
+            request = self._requests.get()
+            deadline = time.monotonic() + self.batch_wait_ms / 1000
+            while True:
+                # Futures cancelled while still queued are dropped here
+                if request[2].set_running_or_notify_cancel():
+                    batch.append(request)
+                if len(batch) >= self.max_batch_size:
+                    break
+                try:
+                    request = self._requests.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if not batch:
+                continue
+
+            try:
+                responses = self._generate_texts([query for query, _, _ in batch], [limit for _, limit, _ in batch])
+            except Exception as e:
+                responses = [e] * len(batch)
+
+            for (query, _, future), response in zip(batch, responses):
+                # A failure on one future must not stop the only worker thread
+                try:
+                    if isinstance(response, Exception):
+                        future.set_exception(response)
+                    else:
+                        future.set_result(response)
+                except Exception as e:
+                    print(f"Warning: Could not deliver response for {query!r}: {e}")
+
+    def _generate_token_batch(self, queries: List[str], max_new_tokens: int) -> torch.Tensor:
+        """Run one batched generate() call and return only the generated token ids"""
+        # Create context-aware prompts
+        inputs = self._build_inputs(queries)
         
-        # Decode and return the response
-        response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+        # Generate responses; the lock keeps streaming and batched calls off the model at once
+        with self._generate_lock, torch.no_grad():
+            outputs = self.model.generate(**inputs, **self._generation_kwargs(max_new_tokens, len(queries)))
         
-        # Extract only the generated part (after the prompt)
-        response = response[len(prompt):]
-        return response.strip()
+        # Keep only the generated part (after the prompt)
+        return outputs[:, inputs["input_ids"].shape[1]:]
+
+    def generate_response(self, query: str, max_new_tokens: int = 500) -> str:
+        """Generate a response about carbon-related topics"""
+        # Goes through the batching worker so concurrent callers share forward passes
+        return self.submit(query, max_new_tokens).result()
+
+    def stream_response(self, query: str, max_new_tokens: int = 500) -> Iterator[str]:
+        """Yield the response in chunks as tokens are generated"""
+        if self.backend == "vllm":
+            # The offline vLLM engine returns whole completions
+            yield self.generate_response(query, max_new_tokens)
+            return
+
+        inputs = self._build_inputs([query])
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        errors = []
+
+        def run_generation():
+            try:
+                with self._generate_lock:
+                    self.model.generate(**inputs, **self._generation_kwargs(max_new_tokens), streamer=streamer)
+            except Exception as e:
+                # Unblock the consumer so the error can be raised on the caller's thread
+                errors.append(e)
+                streamer.end()
+
+        # Generate on a background thread and hand text back as it is decoded
+        thread = Thread(target=run_generation, daemon=True)
+        thread.start()
+        for chunk in streamer:
+            yield chunk
+        thread.join()
+
+        if errors:
+            raise errors[0]
+
+    def _opinion_query(self, topic: str) -> str:
+        return f"What is the relationship between carbon and {topic}? Please provide scientific insights and implications."
 
     def get_carbon_opinion(self, topic: str) -> str:
         """Get an informed opinion about a carbon-related topic"""
-        query = f"What is the relationship between carbon and {topic}? Please provide scientific insights and implications."
-        return self.generate_response(query)
+        return self.generate_response(self._opinion_query(topic))
+
+    def get_carbon_opinions(self, topics: List[str]) -> List[str]:
+        """Get opinions on several topics, generated together in batches"""
+        futures = [self.submit(self._opinion_query(topic)) for topic in topics]
+        return [future.result() for future in futures]
 
 # Example usage
 if __name__ == "__main__":
@@ -89,10 +297,8 @@ if __name__ == "__main__":
     
     print("Carbon AI Model Test:")
     print("-" * 50)
-    for topic in sample_topics:
+    responses = carbon_ai.get_carbon_opinions(sample_topics)
+    for topic, response in zip(sample_topics, responses):
         print(f"\nTopic: {topic}")
-        response = carbon_ai.get_carbon_opinion(topic)
         print(f"Response: {response}\n")
         print("-" * 50)
-
-
@@ -1,15 +1,21 @@
 import pandas as pd
 import re
-from tqdm import tqdm
 
-def clean_and_format_text(text):
-    # Remove any remaining HTML tags
-    text = re.sub(r'<[^>]+>', '', str(text))
-    # Remove special characters but keep necessary punctuation
-    text = re.sub(r'[^\w\s.,;?!()\-:]', '', text)
-    # Remove multiple spaces
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
+# Runs of HTML tags, whitespace, and special characters (except necessary
+# punctuation), matched in a single pass; group 1 is set when the run contains
+# whitespace
+CLEAN_RE = re.compile(r'(?:<[^>]+>|(\s)|[^\w\s.,;?!()\-:])+')
+
+def _clean_run(match):
+    # A run that contained whitespace becomes a single space, anything else is dropped
+    return ' ' if match.group(1) else ''
+
+def clean_and_format_text(texts):
+    """Clean a Series of article texts column-wise"""
+    # Remove HTML tags and special characters and collapse multiple spaces
+    return (texts.fillna('').astype(str)
+            .str.replace(CLEAN_RE, _clean_run, regex=True)
+            .str.strip())
 
 def process_carbon_data(input_file='carbon.csv', output_file='carbon.txt'):
     try:
@@ -17,18 +23,15 @@ def process_carbon_data(input_file='carbon.csv', output_file='carbon.txt'):
         df = pd.read_csv(input_file)
         print(f"Processing {len(df)} articles...")
 
+        # Build section headers and cleaned content for all articles at once
+        rule = '=' * 80
+        headers = (f"\n{rule}\nSUBJECT: " + df['Title'].fillna('').astype(str)
+                   + "\nCATEGORY: " + df['Search_Term'].fillna('').astype(str)
+                   + f"\n{rule}\n\n")
+        sections = headers + clean_and_format_text(df['Content']) + '\n\n'
+
         with open(output_file, 'w', encoding='utf-8') as f:
-            for idx, row in tqdm(df.iterrows(), total=len(df), desc="Processing articles"):
-                # Write section header
-                f.write(f"\n{'='*80}\n")
-                f.write(f"SUBJECT: {row['Title']}\n")
-                f.write(f"CATEGORY: {row['Search_Term']}\n")
-                f.write(f"{'='*80}\n\n")
-
-                # Clean and write content
-                content = clean_and_format_text(row['Content'])
-                f.write(content)
-                f.write('\n\n')
+            f.write(''.join(sections))
 
         print(f"\nSuccessfully processed data and saved to {output_file}")
         
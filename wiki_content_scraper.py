@@ -1,65 +1,39 @@
 import pandas as pd
 import requests
-from bs4 import BeautifulSoup
 import time
-import re
 from tqdm import tqdm
+from wiki_extracts import API_URL, EXTRACTS_BATCH_SIZE, ExtractsScraper, collect_extracts, extracts_params, resolve_title
 
-class WikiContentScraper:
+class WikiContentScraper(ExtractsScraper):
     def __init__(self):
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        self.total_size_bytes = 0
-        self.successful_downloads = 0
-        self.failed_downloads = 0
+        super().__init__()
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
 
-    def clean_text(self, text):
-        # Remove citations [1], [2], etc.
-        text = re.sub(r'\[\d+\]', '', text)
-        # Remove multiple spaces
-        text = re.sub(r'\s+', ' ', text)
-        # Remove special characters but keep basic punctuation
-        text = re.sub(r'[^\w\s.,;?!-]', '', text)
-        return text.strip()
-
-    def get_page_content(self, url):
+    def get_batch_content(self, titles):
+        """Fetch plain-text extracts for a batch of titles, returned in the same order"""
+        params = extracts_params(titles)
+        extracts = {}
+        aliases = {}
         try:
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # Remove unwanted elements
-            for element in soup.find_all(['script', 'style', 'footer', 'header', 'nav']):
-                element.decompose()
+            while True:
+                response = self.session.get(API_URL, params=params)
+                response.raise_for_status()
+                data = response.json()
+                collect_extracts(data, extracts, aliases)
 
-            # Get the main content div
-            content = soup.find(id='mw-content-text')
-            if not content:
-                self.failed_downloads += 1
-                return ""
+                # Whole-article extracts come back a page at a time; follow the continuation
+                if 'continue' not in data:
+                    break
+                params = {**params, **data['continue']}
 
-            # Extract text from paragraphs
-            paragraphs = content.find_all('p')
-            text = ' '.join(p.get_text() for p in paragraphs)
-            
-            # Clean the text
-            cleaned_text = self.clean_text(text)
-            
-            # Calculate and print size information
-            size_bytes = len(cleaned_text.encode('utf-8'))
-            size_kb = size_bytes / 1024
-            print(f"Downloaded {size_kb:.2f} KB from {url}")
-            
-            self.total_size_bytes += size_bytes
-            self.successful_downloads += 1
-            
-            return cleaned_text
+                # Keep to one request per second, as the per-page scraper did
+                time.sleep(1)
 
         except Exception as e:
-            print(f"Error scraping {url}: {str(e)}")
-            self.failed_downloads += 1
-            return ""
+            print(f"Error fetching extracts: {str(e)}")
+
+        return [self.record_content(title, extracts.get(resolve_title(title, aliases))) for title in titles]
 
     def scrape_links(self, input_file='carbon_family_links.csv', output_file='carbon.csv'):
         try:
@@ -67,19 +41,19 @@ class WikiContentScraper:
             df = pd.read_csv(input_file)
             print(f"Found {len(df)} links in total")
 
-            # Add a new column for content
-            df['Content'] = ''
-            
-            # Scrape content for each URL with progress bar
+            # Fetch plain-text extracts in batches of titles with progress bar
             start_time = time.time()
-            for index in tqdm(df.index, desc="Scraping Wikipedia pages"):
-                url = df.loc[index, 'URL']
-                content = self.get_page_content(url)
-                df.loc[index, 'Content'] = content
+            titles = [str(title) for title in df['Title']]
+            contents = []
+            for i in tqdm(range(0, len(titles), EXTRACTS_BATCH_SIZE), desc="Fetching Wikipedia extracts"):
+                contents.extend(self.get_batch_content(titles[i:i + EXTRACTS_BATCH_SIZE]))
                 
                 # Add a small delay to be nice to Wikipedia's servers
                 time.sleep(1)
 
+            # Add the content column in one assignment
+            df['Content'] = contents
+
             # Calculate execution time
             execution_time = time.time() - start_time
             
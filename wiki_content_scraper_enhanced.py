@@ -1,26 +1,164 @@
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
+from lxml import etree
 import time
 import re
 from tqdm import tqdm
 import asyncio
 import aiohttp
-import json
+from aiolimiter import AsyncLimiter
 import logging
 import argparse
 from pathlib import Path
 import sys
 from typing import Dict, List, Optional
 import psutil
-import urllib3
 from datetime import datetime
 import signal
+import random
+import csv
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Runs of citations [1], [2], etc., spaces/tabs (newlines are kept for structure),
+# and special characters except basic punctuation; group 1 is set when the run
+# contains a space or tab
+CLEAN_RE = re.compile(r'(?:\[\d+\]|([ \t])|[^\w\s.,;?!():\-\n])+')
+
+def _clean_run(match: re.Match) -> str:
+    """A run that contained spaces becomes a single space, anything else is dropped"""
+    return ' ' if match.group(1) else ''
+
+CONTENT_TAGS = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'table']
+UNWANTED_TAGS = ['script', 'style', 'footer', 'header', 'nav']
+PARSE_CHUNK_SIZE = 64 * 1024
+
+def format_element(name: str, text: str, items: List[str]) -> List[str]:
+    """Render one content element as lines of structured text"""
+    if name.startswith('h'):
+        return [f"\n== {text.strip()} ==\n"]
+    elif name in ['ul', 'ol']:
+        return [f"- {item.strip()}" for item in items]
+    elif name == 'table':
+        return ["[Table content preserved]"]
+    return [text.strip()]
+
+def _element_text(element) -> str:
+    return ''.join(element.itertext())
+
+def parse_page(html: str) -> Dict:
+    """Extract title, categories and structured main-content text from a page in one streaming pass"""
+    parser = etree.HTMLPullParser(events=('start', 'end'), tag=CONTENT_TAGS + UNWANTED_TAGS + ['div', 'title'])
+    parsed = {'title': None, 'categories': []}
+    structured_content = []
+    open_elements = []  # Slots of content elements still waiting for their end tag
+    in_content = content_done = catlinks_done = False
+    unwanted_depth = 0
+    
+    for offset in range(0, len(html), PARSE_CHUNK_SIZE):
+        parser.feed(html[offset:offset + PARSE_CHUNK_SIZE])
+        for event, element in parser.read_events():
+            tag = element.tag
+            if tag in UNWANTED_TAGS:
+                unwanted_depth += 1 if event == 'start' else -1
+            elif tag == 'div':
+                if element.get('id') == 'mw-content-text':
+                    in_content = event == 'start'
+                    content_done = event == 'end'
+                elif event == 'end' and 'mw-normal-catlinks' in element.get('class', '').split():
+                    parsed['categories'].append(' '.join(t.strip() for t in element.itertext() if t.strip()))
+                    catlinks_done = True
+            elif tag == 'title':
+                if event == 'end' and parsed['title'] is None:
+                    parsed['title'] = _element_text(element)
+            elif in_content and not unwanted_depth:
+                if event == 'start':
+                    # Reserve a slot so nested elements keep document order
+                    open_elements.append(len(structured_content))
+                    structured_content.append([])
+                elif open_elements:
+                    etree.strip_elements(element, *UNWANTED_TAGS, etree.Comment, with_tail=False)
+                    items = [_element_text(li) for li in element.iter('li')] if tag in ['ul', 'ol'] else []
+                    structured_content[open_elements.pop()] = format_element(tag, _element_text(element), items)
+                    if not open_elements:
+                        # Nothing above still needs this subtree, so free it
+                        element.clear()
+                        while element.getprevious() is not None:
+                            del element.getparent()[0]
+        
+        # Categories follow the main content, nothing after them is needed
+        if content_done and catlinks_done:
+            break
+    else:
+        parser.close()
+    
+    if not (in_content or content_done):
+        raise Exception("No main content found")
+    
+    parsed['title'] = parsed['title'] or ''
+    parsed['text'] = '\n'.join(line for lines in structured_content for line in lines)
+    return parsed
+
+def _init_parse_worker():
+    """Leave Ctrl+C and SIGTERM to the main process, which saves the checkpoint"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+RESULT_FIELDS = ['url', 'content', 'metadata', 'error', 'size_bytes']
+RESULT_SCHEMA = pa.schema([
+    ('url', pa.string()),
+    ('content', pa.string()),
+    ('metadata', pa.struct([
+        ('title', pa.string()),
+        ('last_modified', pa.string()),
+        ('categories', pa.list_(pa.string()))
+    ])),
+    ('error', pa.string()),
+    ('size_bytes', pa.int64())
+])
+
+class ResultWriter:
+    """Append scraped results to a Parquet, JSON Lines or CSV file one batch at a time"""
+    
+    def __init__(self, output_file: str, append: bool = False):
+        self.format = Path(output_file).suffix.lower()
+        if self.format == '.parquet':
+            # Parquet files cannot be reopened for appending; scrape_links picks a new file when resuming
+            self.writer = pq.ParquetWriter(output_file, RESULT_SCHEMA, compression='zstd')
+        elif self.format == '.jsonl':
+            self.file = open(output_file, 'ab' if append else 'wb')
+        else:
+            write_header = not (append and Path(output_file).exists())
+            self.file = open(output_file, 'a' if append else 'w', newline='', encoding='utf-8')
+            self.writer = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS)
+            if write_header:
+                self.writer.writeheader()
+    
+    def write_batch(self, results: List[Dict]):
+        """Write one batch of results and flush it to disk"""
+        if not results:
+            return
+        if self.format == '.parquet':
+            self.writer.write_table(pa.Table.from_pylist(results, schema=RESULT_SCHEMA))
+        elif self.format == '.jsonl':
+            self.file.write(b''.join(orjson.dumps(result) + b'\n' for result in results))
+            self.file.flush()
+        else:
+            self.writer.writerows(results)
+            self.file.flush()
+    
+    def close(self):
+        if self.format == '.parquet':
+            self.writer.close()
+        else:
+            self.file.close()
 
 class WikiContentScraper:
     def __init__(self, config_file: str = 'scraper_config.json'):
-        self.load_config(config_file)
         self.setup_logging()
+        self.load_config(config_file)
         self.setup_session()
         self.initialize_stats()
         self.setup_signal_handlers()
@@ -39,8 +177,7 @@ class WikiContentScraper:
     def load_config(self, config_file: str):
         """Load configuration from JSON file or use defaults"""
         try:
-            with open(config_file, 'r') as f:
-                self.config = json.load(f)
+            self.config = orjson.loads(Path(config_file).read_bytes())
         except FileNotFoundError:
             self.logger.warning(f"Config file {config_file} not found. Using defaults.")
             self.config = {
@@ -55,8 +192,7 @@ class WikiContentScraper:
                 ]
             }
             # Save default config
-            with open(config_file, 'w') as f:
-                json.dump(self.config, f, indent=4)
+            Path(config_file).write_bytes(orjson.dumps(self.config, option=orjson.OPT_INDENT_2))
     
     def setup_logging(self):
         """Configure logging with different levels"""
@@ -80,19 +216,27 @@ class WikiContentScraper:
         self.logger.addHandler(ch)
     
     def setup_session(self):
-        """Setup HTTP session with connection pooling"""
-        self.session = requests.Session()
-        adapter = requests.adapters.HTTPAdapter(
-            pool_connections=100,
-            pool_maxsize=100,
-            max_retries=urllib3.util.Retry(
-                total=self.config['max_retries'],
-                backoff_factor=0.3,
-                status_forcelist=[500, 502, 503, 504]
+        """Setup rate limiting; the pooled HTTP session is opened inside the event loop"""
+        self.session: Optional[aiohttp.ClientSession] = None
+        # HTML parsing runs in this process pool while scrape_links is active
+        self.pool: Optional[ProcessPoolExecutor] = None
+        
+        # Token bucket shared by all downloads: one request per rate_limit seconds
+        self.limiter = AsyncLimiter(1, self.config['rate_limit'])
+    
+    async def _ensure_session(self):
+        """Open the HTTP session shared by all batches, keeping connections alive between them"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=100,
+                    limit_per_host=self.config['batch_size'],
+                    ttl_dns_cache=300,
+                    keepalive_timeout=60
+                ),
+                headers={'User-Agent': random.choice(self.config['user_agents'])},
+                timeout=aiohttp.ClientTimeout(total=self.config['timeout'])
             )
-        )
-        self.session.mount('http://', adapter)
-        self.session.mount('https://', adapter)
     
     def initialize_stats(self):
         """Initialize statistics tracking"""
@@ -108,15 +252,10 @@ class WikiContentScraper:
     
     def clean_text(self, text: str) -> str:
         """Enhanced text cleaning with structure preservation"""
-        # Remove citations [1], [2], etc.
-        text = re.sub(r'\[\d+\]', '', text)
-        # Remove multiple spaces while preserving newlines
-        text = re.sub(r'[ \t]+', ' ', text)
-        # Remove special characters but keep basic punctuation and structure
-        text = re.sub(r'[^\w\s.,;?!():\-\n]', '', text)
-        return text.strip()
+        # Remove citations and special characters and collapse spaces in one pass
+        return CLEAN_RE.sub(_clean_run, text).strip()
     
-    async def get_page_content(self, url: str, session: aiohttp.ClientSession) -> Dict:
+    async def get_page_content(self, url: str) -> Dict:
         """Asynchronously get page content with enhanced error handling and validation"""
         result = {
             'url': url,
@@ -127,58 +266,39 @@ class WikiContentScraper:
         }
         
         try:
-            async with session.get(url, timeout=self.config['timeout']) as response:
+            async with self.limiter, self.session.get(url) as response:
                 if response.status != 200:
                     raise Exception(f"HTTP {response.status}")
                 
                 html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                # Extract metadata
-                result['metadata'] = {
-                    'title': soup.title.string if soup.title else '',
-                    'last_modified': response.headers.get('last-modified', ''),
-                    'categories': [tag.string for tag in soup.find_all('div', {'class': 'mw-normal-catlinks'})]
-                }
-                
-                # Remove unwanted elements
-                for element in soup.find_all(['script', 'style', 'footer', 'header', 'nav']):
-                    element.decompose()
-                
-                # Get main content
-                content = soup.find(id='mw-content-text')
-                if not content:
-                    raise Exception("No main content found")
-                
-                # Extract structured content
-                structured_content = []
-                for element in content.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'table']):
-                    if element.name.startswith('h'):
-                        structured_content.append(f"\n== {element.get_text().strip()} ==\n")
-                    elif element.name in ['ul', 'ol']:
-                        for li in element.find_all('li'):
-                            structured_content.append(f"- {li.get_text().strip()}")
-                    elif element.name == 'table':
-                        structured_content.append("[Table content preserved]")
-                    else:
-                        structured_content.append(element.get_text().strip())
-                
-                text = '\n'.join(structured_content)
-                cleaned_text = self.clean_text(text)
-                
-                # Validate content
-                if len(cleaned_text) < self.config['min_content_length']:
-                    raise Exception("Content too short")
-                
-                result['content'] = cleaned_text
-                result['size_bytes'] = len(cleaned_text.encode('utf-8'))
-                
-                # Update statistics
-                self.stats['successful_downloads'] += 1
-                self.stats['total_size_bytes'] += result['size_bytes']
-                
-                # Log success
-                self.logger.debug(f"Successfully scraped {url} ({result['size_bytes'] / 1024:.2f} KB)")
+                last_modified = response.headers.get('last-modified', '')
+            
+            # Parse in a worker process so the event loop stays free for downloads
+            parsed = await asyncio.get_running_loop().run_in_executor(self.pool, parse_page, html)
+            
+            # Extract metadata
+            result['metadata'] = {
+                'title': parsed['title'],
+                'last_modified': last_modified,
+                'categories': parsed['categories']
+            }
+            
+            text = parsed['text']
+            cleaned_text = self.clean_text(text)
+            
+            # Validate content
+            if len(cleaned_text) < self.config['min_content_length']:
+                raise Exception("Content too short")
+            
+            result['content'] = cleaned_text
+            result['size_bytes'] = len(cleaned_text.encode('utf-8'))
+            
+            # Update statistics
+            self.stats['successful_downloads'] += 1
+            self.stats['total_size_bytes'] += result['size_bytes']
+            
+            # Log success
+            self.logger.debug(f"Successfully scraped {url} ({result['size_bytes'] / 1024:.2f} KB)")
                 
         except Exception as e:
             self.stats['failed_downloads'] += 1
@@ -190,20 +310,20 @@ class WikiContentScraper:
     def save_checkpoint(self):
         """Save current progress to checkpoint file"""
         checkpoint = {
-            'stats': self.stats,
+            # JSON has no set type, so processed URLs are stored as a list
+            'stats': {**self.stats, 'processed_urls': list(self.stats['processed_urls'])},
             'timestamp': datetime.now().isoformat()
         }
-        with open('scraper_checkpoint.json', 'w') as f:
-            json.dump(checkpoint, f)
+        Path('scraper_checkpoint.json').write_bytes(orjson.dumps(checkpoint))
         self.stats['last_checkpoint'] = time.time()
         self.logger.info("Checkpoint saved")
     
     def load_checkpoint(self) -> bool:
         """Load progress from checkpoint file"""
         try:
-            with open('scraper_checkpoint.json', 'r') as f:
-                checkpoint = json.load(f)
+            checkpoint = orjson.loads(Path('scraper_checkpoint.json').read_bytes())
             self.stats = checkpoint['stats']
+            self.stats['processed_urls'] = set(self.stats['processed_urls'])
             self.logger.info(f"Checkpoint loaded from {checkpoint['timestamp']}")
             return True
         except FileNotFoundError:
@@ -219,39 +339,52 @@ class WikiContentScraper:
     
     async def process_batch(self, urls: List[str]) -> List[Dict]:
         """Process a batch of URLs concurrently"""
-        async with aiohttp.ClientSession() as session:
-            tasks = []
-            for url in urls:
-                if url not in self.stats['processed_urls']:
-                    tasks.append(self.get_page_content(url, session))
-                    self.stats['processed_urls'].add(url)
-                    await asyncio.sleep(self.config['rate_limit'])  # Rate limiting
-            
-            return await asyncio.gather(*tasks)
+        tasks = []
+        for url in urls:
+            if url not in self.stats['processed_urls']:
+                tasks.append(self.get_page_content(url))
+                self.stats['processed_urls'].add(url)
+        
+        return await asyncio.gather(*tasks)
     
     async def scrape_links(self, input_file: str = 'carbon_family_links.csv', 
-                          output_file: str = 'carbon_enhanced.csv',
+                          output_file: str = 'carbon_enhanced.parquet',
                           resume: bool = True):
         """Main scraping function with batching and checkpointing"""
+        writer = None
         try:
             # Initialize or resume
-            if resume and self.load_checkpoint():
+            resumed = resume and self.load_checkpoint()
+            if resumed:
                 self.logger.info("Resuming from checkpoint")
             else:
                 self.stats['start_time'] = time.time()
             
+            await self._ensure_session()
+            self.pool = ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_parse_worker)
+            
             # Read input file
             df = pd.read_csv(input_file)
             self.logger.info(f"Found {len(df)} links in total")
             
+            # Parquet cannot be appended, so a resumed run writes a new part next to the
+            # earlier output rather than overwriting results the checkpoint now skips
+            output_path = Path(output_file)
+            if resumed and output_path.suffix.lower() == '.parquet' and output_path.exists():
+                output_file = str(output_path.with_name(
+                    f"{output_path.stem}.part-{datetime.now().strftime('%Y%m%d-%H%M%S')}{output_path.suffix}"))
+                self.logger.info(f"Keeping earlier results in {output_path}; writing this run to {output_file}")
+            
+            # Results are written as each batch finishes, appending when resuming
+            writer = ResultWriter(output_file, append=resumed)
+            
             # Process in batches
-            results = []
             for i in range(0, len(df), self.config['batch_size']):
                 batch_urls = df['URL'].iloc[i:i + self.config['batch_size']].tolist()
                 
                 # Process batch
                 batch_results = await self.process_batch(batch_urls)
-                results.extend(batch_results)
+                writer.write_batch(batch_results)
                 
                 # Periodic checkpoint
                 if i % self.config['checkpoint_frequency'] == 0:
@@ -261,11 +394,8 @@ class WikiContentScraper:
                 # Update progress
                 self.logger.info(f"Processed {i + len(batch_results)}/{len(df)} URLs")
             
-            # Create output dataframe
-            output_df = pd.DataFrame(results)
-            
-            # Save results
-            output_df.to_csv(output_file, index=False)
+            writer.close()
+            writer = None
             self.logger.info(f"Results saved to {output_file}")
             
             # Final statistics
@@ -284,11 +414,19 @@ class WikiContentScraper:
             self.logger.error(f"Error in scrape_links: {str(e)}")
             self.save_checkpoint()  # Save progress on error
             raise
+        finally:
+            if writer is not None:
+                writer.close()
+            if self.pool is not None:
+                self.pool.shutdown()
+            if self.session is not None:
+                await self.session.close()
 
 def main():
     parser = argparse.ArgumentParser(description='Enhanced Wikipedia Content Scraper')
     parser.add_argument('--input', default='carbon_family_links.csv', help='Input CSV file')
-    parser.add_argument('--output', default='carbon_enhanced.csv', help='Output CSV file')
+    parser.add_argument('--output', default='carbon_enhanced.parquet',
+                        help='Output file; format follows the extension (.parquet, .jsonl or .csv)')
     parser.add_argument('--config', default='scraper_config.json', help='Configuration file')
     parser.add_argument('--no-resume', action='store_true', help='Do not resume from checkpoint')
     args = parser.parse_args()
@@ -0,0 +1,76 @@
+import re
+
+# Runs of citations [1], [2], etc., whitespace, and special characters (except
+# basic punctuation); group 1 is set when the run contains whitespace
+CLEAN_RE = re.compile(r'(?:\[\d+\]|(\s)|[^\w\s.,;?!-])+')
+
+def _clean_run(match):
+    # A run that contained whitespace becomes a single space, anything else is dropped
+    return ' ' if match.group(1) else ''
+
+API_URL = "https://en.wikipedia.org/w/api.php"
+# Titles per extracts query, the most the API accepts
+EXTRACTS_BATCH_SIZE = 20
+
+def extracts_params(titles):
+    """Query parameters for the plain-text extracts of a batch of titles"""
+    return {
+        "action": "query",
+        "format": "json",
+        "prop": "extracts",
+        "explaintext": 1,
+        "exlimit": EXTRACTS_BATCH_SIZE,
+        "redirects": 1,
+        "titles": "|".join(titles)
+    }
+
+def collect_extracts(data, extracts, aliases):
+    """Merge the extracts and title normalizations/redirects of one API response"""
+    query = data.get('query', {})
+    for item in query.get('normalized', []) + query.get('redirects', []):
+        aliases[item['from']] = item['to']
+    for page in query.get('pages', {}).values():
+        if page.get('extract'):
+            extracts[page['title']] = page['extract']
+
+def resolve_title(title, aliases):
+    """Follow normalizations and redirects from a requested title to the page title"""
+    seen = set()
+    while title in aliases and title not in seen:
+        seen.add(title)
+        title = aliases[title]
+    return title
+
+class ExtractsScraper:
+    """Shared cleaning and statistics for the scrapers built on the extracts API"""
+
+    def __init__(self):
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        }
+        self.total_size_bytes = 0
+        self.successful_downloads = 0
+        self.failed_downloads = 0
+
+    def clean_text(self, text):
+        # Remove citations and special characters and collapse spaces in one pass
+        return CLEAN_RE.sub(_clean_run, text).strip()
+
+    def record_content(self, title, text):
+        if not text:
+            print(f"No content found for {title}")
+            self.failed_downloads += 1
+            return ""
+
+        # Clean the text
+        cleaned_text = self.clean_text(text)
+        
+        # Calculate and print size information
+        size_bytes = len(cleaned_text.encode('utf-8'))
+        size_kb = size_bytes / 1024
+        print(f"Downloaded {size_kb:.2f} KB for {title}")
+        
+        self.total_size_bytes += size_bytes
+        self.successful_downloads += 1
+        
+        return cleaned_text